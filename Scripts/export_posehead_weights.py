@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
+import argparse
 import os
-import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from posehead_common import find_tensor, index_by_shape, process_head_tensor
 
 # ---------------------------------------------------------------------
 #  Config
 # ---------------------------------------------------------------------
 MODEL_PATH = "pose_landmark_full.tflite"
 OUT_DIR    = "weights"
+STREAM_DIR = os.path.join(OUT_DIR, "streams")
+
+# Threads used to overlap quantization/np.save of the six head tensors
+DUMP_WORKERS = 4
 
 # Disable XNNPACK to avoid any weirdness with internal tensors
 os.environ.setdefault("TFLITE_DISABLE_XNNPACK", "1")
@@ -19,96 +27,86 @@ except ImportError:
     tflite = tf.lite
 
 
+# The TFLite interpreter is not safe for concurrent get_tensor() calls
+_INTERPRETER_LOCK = threading.Lock()
+
+
 # ---------------------------------------------------------------------
 #  Helpers
 # ---------------------------------------------------------------------
-def quantize_q15(arr: np.ndarray) -> np.ndarray:
-    """
-    Convert float (FP16/FP32) to Q15 int16: x_q15 = round(x * 2^15), clamped.
-    """
-    a = arr.astype(np.float64)
-    scale = float(1 << 15)
-    q = np.round(a * scale)
-    q = np.clip(q, -32768, 32767).astype(np.int16)
-    return q
-
-
-def find_tensor(details, name_substr, expected_shape):
-    """
-    Find a unique tensor whose name contains `name_substr` and whose shape
-    matches `expected_shape`. Prefer non-*_dequantize tensors.
+def dump_tensor(interpreter, tensor_info, base_name, stream_name=None, stream_t_name=None,
+                want_fp32=True, want_q15=True, text=True, compress=False):
     """
-    matches = []
-    for d in details:
-        if name_substr in d["name"] and tuple(d["shape"]) == tuple(expected_shape):
-            matches.append(d)
-
-    if not matches:
-        msg = [
-            f"ERROR: No tensor found for substring='{name_substr}',",
-            f"       expected shape={tuple(expected_shape)}",
-        ]
-        raise RuntimeError("\n".join(msg))
-
-    # Prefer non-dequantize tensors
-    non_deq = [d for d in matches if "dequantize" not in d["name"].lower()]
-    if len(non_deq) == 1:
-        return non_deq[0]
-    if len(non_deq) > 1:
-        matches = non_deq
-
-    if len(matches) != 1:
-        msg = ["ERROR: Ambiguous tensor match:"]
-        for d in matches:
-            msg.append(
-                f"  idx={d['index']}, name={d['name']}, shape={tuple(d['shape'])}, dtype={d['dtype']}"
-            )
-        raise RuntimeError("\n".join(msg))
-
-    return matches[0]
-
-
-def dump_tensor(interpreter, tensor_info, base_name):
-    """
-    Get tensor data from interpreter and save:
-      <OUT_DIR>/<base_name>_fp32.npy
-      <OUT_DIR>/<base_name>_q15.npy
+    Get tensor data from interpreter and write its artifacts in one pass
+    (see posehead_common.process_head_tensor):
+      <OUT_DIR>/<base_name>_fp32.npy, <OUT_DIR>/<base_name>_q15.npy (.npz if compress)
+      <STREAM_DIR>/<stream_name>.{bin,txt}     (out_x_in)
+      <STREAM_DIR>/<stream_t_name>.{bin,txt}   (in_x_out, weights only)
     Returns (fp32_array, q15_array).
+    Safe to call from several threads: only the interpreter access is locked.
     """
     idx = tensor_info["index"]
-    arr = interpreter.get_tensor(idx)
-
-    # Convert FP16 -> FP32 if needed
-    if arr.dtype == np.float16:
-        arr_fp32 = arr.astype(np.float32)
-    else:
-        arr_fp32 = arr.astype(np.float32)
-
-    q15 = quantize_q15(arr_fp32)
-
-    os.makedirs(OUT_DIR, exist_ok=True)
-    fp32_path = os.path.join(OUT_DIR, f"{base_name}_fp32.npy")
-    q15_path  = os.path.join(OUT_DIR, f"{base_name}_q15.npy")
+    with _INTERPRETER_LOCK:
+        arr = interpreter.get_tensor(idx)  # copies out of the TFLite arena
+
+    stream_base = os.path.join(STREAM_DIR, stream_name) if stream_name else None
+    stream_t_base = os.path.join(STREAM_DIR, stream_t_name) if stream_t_name else None
+    arr_fp32, q15, lines = process_head_tensor(
+        base_name, arr, OUT_DIR, stream_base, stream_t_base,
+        want_fp32=want_fp32, want_q15=want_q15, text=text, compress=compress,
+    )
 
-    np.save(fp32_path, arr_fp32)
-    np.save(q15_path, q15)
+    # Print the log lines in one go so threads don't interleave
+    print("\n".join(lines))
+    return arr_fp32, q15
 
-    print(f"    Saved {base_name}:")
-    print(f"      FP32 -> {fp32_path}  shape={arr_fp32.shape}, dtype={arr_fp32.dtype}")
-    print(f"      Q15  -> {q15_path}   shape={q15.shape}, dtype={q15.dtype}")
 
-    return arr_fp32, q15
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export BlazePose pose-head weights.")
+    parser.add_argument(
+        "--formats",
+        choices=["both", "fp32", "q15"],
+        default="both",
+        help="Which .npy variants to write (fp32 is used by make_posehead_input_stream.py "
+             "and validate_posehead_weight.py, q15 by make_posehead_streams.py)",
+    )
+    parser.add_argument(
+        "--no-streams",
+        action="store_true",
+        help="Don't write the weights/streams/*_head_{weights,bias}_stream files",
+    )
+    parser.add_argument(
+        "--no-text",
+        action="store_true",
+        help="Only write the binary .bin streams (skip the .txt streams, which "
+             "prepare_aie_memory_blobs.py reads)",
+    )
+    parser.add_argument(
+        "--transposed-streams",
+        action="store_true",
+        help="Also write *_head_weights_T_stream files in (in_ch, out_ch) order; the "
+             "current AIE kernels read the default (out_ch, in_ch) streams",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Write the FP32/Q15 tensors as compressed .npz (key 'data') instead of .npy; "
+             "the manifest points at the .npz files and all loaders accept both",
+    )
+    return parser.parse_args()
 
 
-# ---------------------------------------------------------------------
-#  Main
-# ---------------------------------------------------------------------
 def main():
+    args = parse_args()
+    want_fp32 = args.formats in ("both", "fp32")
+    want_q15 = args.formats in ("both", "q15")
+
     print(f"[1] Loading TFLite model: {MODEL_PATH}")
     interpreter = tflite.Interpreter(model_path=MODEL_PATH)
     interpreter.allocate_tensors()
     details = interpreter.get_tensor_details()
     print(f"    allocate_tensors() done, #tensors = {len(details)}")
+    shape_index = index_by_shape(details)
 
     # -----------------------------------------------------------------
     #  Find pose-head tensors (names/shapes from tensors.json)
@@ -117,12 +115,12 @@ def main():
 
     # Pose3D head
     pose3d_w_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/convld_3d/Conv2D",
         expected_shape=(195, 2, 2, 288),
     )
     pose3d_b_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/convld_3d/BiasAdd",
         expected_shape=(195,),
     )
@@ -136,12 +134,12 @@ def main():
 
     # World head
     world_w_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/convworld_3d/Conv2D",
         expected_shape=(117, 2, 2, 288),
     )
     world_b_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/convworld_3d/BiasAdd",
         expected_shape=(117,),
     )
@@ -155,12 +153,12 @@ def main():
 
     # Flag head
     flag_w_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/conv_poseflag/Conv2D",
         expected_shape=(1, 2, 2, 288),
     )
     flag_b_info = find_tensor(
-        details,
+        shape_index,
         name_substr="model_1/model/conv_poseflag/BiasAdd",
         expected_shape=(1,),
     )
@@ -173,18 +171,34 @@ def main():
           f"dtype={flag_b_info['dtype']}, name={flag_b_info['name']}")
 
     # -----------------------------------------------------------------
-    #  Dump to FP32 + Q15 .npy files
+    #  Dump to FP32 + Q15 .npy files and PLIO streams
     # -----------------------------------------------------------------
-    print("\n[3] Exporting weights/biases (FP32 + Q15)…")
-
-    pose3d_w_fp32, pose3d_w_q15 = dump_tensor(interpreter, pose3d_w_info, "pose3d_w")
-    pose3d_b_fp32, pose3d_b_q15 = dump_tensor(interpreter, pose3d_b_info, "pose3d_b")
-
-    world_w_fp32, world_w_q15 = dump_tensor(interpreter, world_w_info, "world_w")
-    world_b_fp32, world_b_q15 = dump_tensor(interpreter, world_b_info, "world_b")
-
-    flag_w_fp32, flag_w_q15 = dump_tensor(interpreter, flag_w_info, "flag_w")
-    flag_b_fp32, flag_b_q15 = dump_tensor(interpreter, flag_b_info, "flag_b")
+    print(f"\n[3] Exporting weights/biases ({args.formats})…")
+
+    os.makedirs(STREAM_DIR, exist_ok=True)  # also creates OUT_DIR
+    to_dump = [
+        (pose3d_w_info, "pose3d_w", "pose3d_head_weights_stream", "pose3d_head_weights_T_stream"),
+        (pose3d_b_info, "pose3d_b", "pose3d_head_bias_stream", None),
+        (world_w_info, "world_w", "world_head_weights_stream", "world_head_weights_T_stream"),
+        (world_b_info, "world_b", "world_head_bias_stream", None),
+        (flag_w_info, "flag_w", "flag_head_weights_stream", "flag_head_weights_T_stream"),
+        (flag_b_info, "flag_b", "flag_head_bias_stream", None),
+    ]
+    write_streams = not args.no_streams
+    write_t_streams = write_streams and args.transposed_streams
+
+    # get_tensor() is serialized by a lock; quantization and file writes overlap
+    with ThreadPoolExecutor(max_workers=DUMP_WORKERS) as executor:
+        list(executor.map(
+            lambda t: dump_tensor(
+                interpreter, t[0], t[1],
+                stream_name=t[2] if write_streams else None,
+                stream_t_name=t[3] if write_t_streams else None,
+                want_fp32=want_fp32, want_q15=want_q15, text=not args.no_text,
+                compress=args.compress,
+            ),
+            to_dump,
+        ))
 
     # -----------------------------------------------------------------
     #  Manifest for convenience
@@ -224,6 +238,24 @@ def main():
         },
     }
 
+    # Only list the tensor variants written by this run (--formats), so no
+    # consumer picks up a stale file; names follow --compress. Stream layout:
+    # one row per output channel (what the AIE kernels read), plus the
+    # optional transposed stream
+    skipped = [] if want_fp32 else ["w_fp32", "b_fp32"]
+    skipped += [] if want_q15 else ["w_q15", "b_q15"]
+    for head, info in manifest["heads"].items():
+        for key in skipped:
+            del info[key]
+        if args.compress:
+            for key in ("w_fp32", "w_q15", "b_fp32", "b_q15"):
+                if key in info:
+                    info[key] = info[key].replace(".npy", ".npz")
+        info["layout"] = "out_x_in"
+        if write_t_streams:
+            info["weights_T_stream"] = f"{head}_head_weights_T_stream.bin"
+            info["weights_T_layout"] = "in_x_out"
+
     import json
     manifest_path = os.path.join(OUT_DIR, "posehead_manifest.json")
     with open(manifest_path, "w") as f:
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 import os
+import argparse
 import numpy as np
+
+# Must be set before the runtime is imported, otherwise XNNPACK is already
+# applied by default and owns the backbone's intermediate tensors.
+os.environ["TFLITE_DISABLE_XNNPACK"] = "1"
+
 import tflite_runtime.interpreter as tflite
 
 # ------------------------------------------------------------------
@@ -25,15 +31,42 @@ def load_input():
     arr = arr.astype(np.float32, copy=False)
     return arr
 
+def make_interpreter():
+    """
+    Build an interpreter with no delegates and all intermediate tensors
+    preserved, so the backbone feature can be read back after invoke().
+    Returns (interpreter, preserved); preserved is False on runtimes without
+    experimental_preserve_all_tensors.
+    """
+    kwargs = dict(
+        model_path=MODEL_PATH,
+        experimental_delegates=[],
+        num_threads=1,
+    )
+    try:
+        return tflite.Interpreter(experimental_preserve_all_tensors=True, **kwargs), True
+    except TypeError:
+        # Older runtimes don't know this flag; intermediates may be reused/unreadable
+        print("    NOTE: runtime has no experimental_preserve_all_tensors, continuing without it")
+        return tflite.Interpreter(**kwargs), False
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate golden IO for the full TFLite model.")
+    parser.add_argument(
+        "--save-all",
+        action="store_true",
+        help="Also fetch and save the seg/heatmap outputs (only needed by "
+             "validate_golden_io.py; the pose-head pipeline uses pose3d/world/flag)",
+    )
+    return parser.parse_args()
+
 # ------------------------------------------------------------------
 # Main
 # ------------------------------------------------------------------
 def main():
+    args = parse_args()
     os.makedirs(OUT_DIR, exist_ok=True)
 
-    # Try to disable XNNPACK (may or may not be honored by this build, but harmless)
-    os.environ["TFLITE_DISABLE_XNNPACK"] = "1"
-
     # 1) Load input
     print("[1] Loading input…")
     inp = load_input()
@@ -42,11 +75,8 @@ def main():
     # 2) Run full model
     print("\n[2] Running full TFLite model (delegates disabled where possible)…")
 
-    # Ask for no delegates explicitly
-    interpreter = tflite.Interpreter(
-        model_path=MODEL_PATH,
-        experimental_delegates=[]
-    )
+    # Ask for no delegates explicitly, keep intermediates readable
+    interpreter, preserved = make_interpreter()
     interpreter.allocate_tensors()
 
     input_details = interpreter.get_input_details()
@@ -68,31 +98,52 @@ def main():
     #  4: Identity_4   -> (1,117)   world keypoints
     out0 = interpreter.get_tensor(output_details[0]["index"])  # pose3d
     out1 = interpreter.get_tensor(output_details[1]["index"])  # flag
-    out2 = interpreter.get_tensor(output_details[2]["index"])  # seg
-    out3 = interpreter.get_tensor(output_details[3]["index"])  # heatmap
     out4 = interpreter.get_tensor(output_details[4]["index"])  # world
 
-    # Save all outputs (FP32)
+    # Save pose-head outputs (FP32)
     np.save(os.path.join(OUT_DIR, "golden_pose3d_fp32.npy"), out0)
     np.save(os.path.join(OUT_DIR, "golden_flag_fp32.npy"),   out1)
-    np.save(os.path.join(OUT_DIR, "golden_seg_fp32.npy"),    out2)
-    np.save(os.path.join(OUT_DIR, "golden_heatmap_fp32.npy"),out3)
     np.save(os.path.join(OUT_DIR, "golden_world_fp32.npy"),  out4)
 
-    print("    Saved full-model outputs:")
+    print("    Saved pose-head outputs:")
     print("      golden_pose3d_fp32.npy  shape", out0.shape)
     print("      golden_flag_fp32.npy    shape", out1.shape)
-    print("      golden_seg_fp32.npy     shape", out2.shape)
-    print("      golden_heatmap_fp32.npy shape", out3.shape)
     print("      golden_world_fp32.npy   shape", out4.shape)
 
-    # 3) Try to grab backbone feature tensor
+    # The large seg/heatmap outputs are not used by the pose-head pipeline
+    if args.save_all:
+        out2 = interpreter.get_tensor(output_details[2]["index"])  # seg
+        out3 = interpreter.get_tensor(output_details[3]["index"])  # heatmap
+
+        np.save(os.path.join(OUT_DIR, "golden_seg_fp32.npy"),    out2)
+        np.save(os.path.join(OUT_DIR, "golden_heatmap_fp32.npy"),out3)
+
+        print("      golden_seg_fp32.npy     shape", out2.shape)
+        print("      golden_heatmap_fp32.npy shape", out3.shape)
+    else:
+        print("      (seg/heatmap skipped, pass --save-all to keep them)")
+        # Don't leave seg/heatmap from an earlier run next to these goldens:
+        # validate_golden_io.py compares any it finds against the new input
+        for name in ("golden_seg_fp32.npy", "golden_heatmap_fp32.npy"):
+            stale = os.path.join(OUT_DIR, name)
+            if os.path.exists(stale):
+                os.remove(stale)
+                print(f"      Removed stale {name} from an earlier run.")
+
+    # 3) Try to grab backbone feature tensor. Without preserve_all_tensors its
+    #    buffer may have been reused by later ops, so nothing is saved then;
+    #    on any failure a feature left over from an earlier run is removed so
+    #    it can't be paired with these goldens.
+    feat_path = os.path.join(OUT_DIR, "golden_backbone_feat_fp32.npy")
     print("\n[3] Trying to read backbone feature tensor", TENSOR_BACKBONE_FEAT, "…")
     try:
+        if not preserved:
+            raise RuntimeError("intermediate tensors not preserved by this runtime")
         feat = interpreter.get_tensor(TENSOR_BACKBONE_FEAT)
-        np.save(os.path.join(OUT_DIR, "golden_backbone_feat_fp32.npy"), feat)
+        np.save(feat_path, feat)
         print("    SUCCESS: backbone feature saved as golden_backbone_feat_fp32.npy")
         print("             shape:", feat.shape)
+        print("             make_posehead_input_stream.py will use it instead of solving for it.")
     except Exception as e:
         # This is expected if a delegate (like XNNPACK) owns that part of the graph.
         print("    WARNING: could not read backbone feature tensor.")
@@ -100,6 +151,9 @@ def main():
         print("             This usually means a delegate took over the backbone,")
         print("             so intermediate tensors are not backed by host memory.")
         print("             Final outputs are still valid and saved.")
+        if os.path.exists(feat_path):
+            os.remove(feat_path)
+            print("             Removed stale golden_backbone_feat_fp32.npy from an earlier run.")
 
     # 4) Save the exact FP32 input we used
     np.save(os.path.join(OUT_DIR, "golden_input_fp32.npy"), inp)
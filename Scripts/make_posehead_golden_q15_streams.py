@@ -2,26 +2,21 @@
 import os
 import numpy as np
 
+from posehead_common import quantize_q15, write_stream_bin, write_stream_txt
+
 GOLDEN_DIR = "golden_outputs"
 WEIGHTS_DIR = "weights"
 STREAM_DIR = os.path.join(WEIGHTS_DIR, "streams")
 
-Q_SCALE = 2**15  # Q15
-
-
-def quantize_to_q15(x: np.ndarray) -> np.ndarray:
-    """Quantize float32 array to Q15 int16 (returned as int32 for PLIO friendliness)."""
-    x = x.astype(np.float32)
-    q = np.round(x * Q_SCALE).astype(np.int32)
-    q = np.clip(q, -32768, 32767)
-    return q
-
 
 def save_head_stream(head_name: str,
                      golden_fname_fp32: str,
                      npy_q15_name: str,
                      stream_txt_name: str):
-    """Load FP32 golden, quantize to Q15, save .npy and text stream."""
+    """
+    Load FP32 golden, quantize to Q15, save .npy (+ headerless .bin) and text stream.
+    Output directories are created once by main().
+    """
     path_fp32 = os.path.join(GOLDEN_DIR, golden_fname_fp32)
     if not os.path.exists(path_fp32):
         raise FileNotFoundError(f"Missing {path_fp32}")
@@ -31,20 +26,20 @@ def save_head_stream(head_name: str,
 
     # Flatten to 1D (but keep full content)
     y_flat = y_fp32.reshape(-1)
-    y_q15 = quantize_to_q15(y_flat)
+    y_q15 = quantize_q15(y_flat)
 
-    # Save Q15 .npy in golden_outputs
-    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    # Save Q15 .npy in golden_outputs, plus a raw int16 .bin sibling for
+    # in-repo consumers: np.fromfile(path, dtype="<i2")
     npy_q15_path = os.path.join(GOLDEN_DIR, npy_q15_name)
-    np.save(npy_q15_path, y_q15.astype(np.int16))
+    bin_q15_path = os.path.splitext(npy_q15_path)[0] + ".bin"
+    np.save(npy_q15_path, y_q15)
+    write_stream_bin(bin_q15_path, y_q15)
     print(f"    -> saved Q15 NPY: {npy_q15_path} (shape={y_q15.shape})")
+    print(f"    -> saved Q15 BIN: {bin_q15_path} (raw little-endian int16)")
 
     # Save text stream in weights/streams
-    os.makedirs(STREAM_DIR, exist_ok=True)
     stream_path = os.path.join(STREAM_DIR, stream_txt_name)
-    with open(stream_path, "w") as f:
-        for v in y_q15:
-            f.write(f"{int(v)}\n")
+    write_stream_txt(stream_path, y_q15)
     print(f"    -> saved text stream: {stream_path} (len={len(y_q15)})")
 
     # Simple stats
@@ -54,6 +49,10 @@ def save_head_stream(head_name: str,
 def main():
     print("[1] Generating Q15 golden output streams for pose-heads…")
 
+    # Directory-level, so create once rather than per head
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    os.makedirs(STREAM_DIR, exist_ok=True)
+
     # Pose3D (1,195)
     save_head_stream(
         head_name="pose3d",
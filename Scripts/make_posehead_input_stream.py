@@ -1,29 +1,41 @@
 #!/usr/bin/env python3
 import os
 import json
+import argparse
 import numpy as np
 
+from posehead_common import Q_SCALE, load_array, quantize_q15, write_stream_bin, write_stream_txt
+
 # Where things live
 WEIGHTS_DIR = "weights"
 GOLDEN_DIR = "golden_outputs"
 STREAM_DIR = os.path.join(WEIGHTS_DIR, "streams")
 
-# Q15 scale (same idea as weights)
-Q_SCALE = 2**15  # 32768.0
+# Backbone feature captured directly by make_golden_io.py (if readable)
+GOLDEN_BACKBONE_FEAT = os.path.join(GOLDEN_DIR, "golden_backbone_feat_fp32.npy")
+
+# A captured feature is only trusted if ||A x - rhs|| / ||rhs|| is below this;
+# an exact capture sits at FP32 rounding level (~1e-7)
+FEAT_REL_RESIDUAL_TOL = 1e-3
 
 
-def load_head_params(head_name: str):
+def load_manifest():
+    """Read weights/posehead_manifest.json (once per run)."""
+    manifest_path = os.path.join(WEIGHTS_DIR, "posehead_manifest.json")
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def load_head_params(head_name: str, manifest: dict):
     """
     Load FP32 weights/bias for a given head from the manifest.
     Returns (W_flat, b), with W_flat shape (out_ch, 1152).
     """
-    manifest_path = os.path.join(WEIGHTS_DIR, "posehead_manifest.json")
-    with open(manifest_path, "r") as f:
-        manifest = json.load(f)
-
     info = manifest["heads"][head_name]
-    w_fp32 = np.load(os.path.join(WEIGHTS_DIR, info["w_fp32"]))  # (out_ch,2,2,288)
-    b_fp32 = np.load(os.path.join(WEIGHTS_DIR, info["b_fp32"]))  # (out_ch,)
+    # Memory-mapped (.npy) or compressed (.npz, export --compress);
+    # the .astype() on return makes the one copy we keep
+    w_fp32 = load_array(os.path.join(WEIGHTS_DIR, info["w_fp32"]), mmap_mode="r")  # (out_ch,2,2,288)
+    b_fp32 = load_array(os.path.join(WEIGHTS_DIR, info["b_fp32"]), mmap_mode="r")  # (out_ch,)
 
     out_ch = info["out_ch"]
     in_ch = info["in_ch"]  # should be 1152
@@ -45,19 +57,57 @@ def load_head_params(head_name: str):
     return W_flat.astype(np.float32), b_fp32.astype(np.float32), info
 
 
+def solve_min_norm(A: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """
+    Minimum-norm solution of the underdetermined system A x = rhs.
+    A is short-and-fat (313 x 1152) with full row rank, so
+      x = A^T (A A^T)^-1 rhs
+    and A A^T is a small SPD matrix we can Cholesky-factor instead of
+    running a full SVD through lstsq. Falls back to lstsq if A A^T is not
+    positive definite (rank-deficient A).
+    """
+    A64 = A.astype(np.float64)
+    G = A64 @ A64.T
+    try:
+        L = np.linalg.cholesky(G)
+    except np.linalg.LinAlgError:
+        print("    WARNING: A A^T not positive definite, falling back to lstsq")
+        x, _, _, _ = np.linalg.lstsq(A, rhs, rcond=None)
+        return x.astype(np.float32)
+
+    z = np.linalg.solve(L, rhs.astype(np.float64))
+    z = np.linalg.solve(L.T, z)
+    return (A64.T @ z).astype(np.float32)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the pose-head input PLIO stream.")
+    parser.add_argument(
+        "--no-text",
+        action="store_true",
+        help="Only write posehead_input_stream.bin (skip the .txt stream, which "
+             "prepare_aie_memory_blobs.py reads)",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    os.makedirs(STREAM_DIR, exist_ok=True)  # also creates WEIGHTS_DIR
+
     print("[1] Loading head weights, biases, and golden outputs…")
+    manifest = load_manifest()
 
     # Load pose3d
-    W_pose3d, b_pose3d, info_pose3d = load_head_params("pose3d")
+    W_pose3d, b_pose3d, info_pose3d = load_head_params("pose3d", manifest)
     y_pose3d = np.load(os.path.join(GOLDEN_DIR, "golden_pose3d_fp32.npy")).reshape(-1)
 
     # Load world
-    W_world, b_world, info_world = load_head_params("world")
+    W_world, b_world, info_world = load_head_params("world", manifest)
     y_world = np.load(os.path.join(GOLDEN_DIR, "golden_world_fp32.npy")).reshape(-1)
 
     # Load flag
-    W_flag, b_flag, info_flag = load_head_params("flag")
+    W_flag, b_flag, info_flag = load_head_params("flag", manifest)
     y_flag = np.load(os.path.join(GOLDEN_DIR, "golden_flag_fp32.npy")).reshape(-1)
 
     print(f"    pose3d: W {W_pose3d.shape}, b {b_pose3d.shape}, y {y_pose3d.shape}")
@@ -67,70 +117,121 @@ def main():
     # Build the big linear system A x = rhs by stacking all heads
     print("\n[2] Building joint linear system across all heads…")
 
-    A = np.vstack([W_pose3d, W_world, W_flag])  # shape (195+117+1, 1152)
-    rhs = np.concatenate([
-        y_pose3d - b_pose3d,
-        y_world  - b_world,
-        y_flag   - b_flag,
-    ])
+    # Rows of each head inside the stacked system
+    n_pose3d = W_pose3d.shape[0]
+    n_world = W_world.shape[0]
+    n_total = n_pose3d + n_world + W_flag.shape[0]
+    head_slices = [
+        ("pose3d", slice(0, n_pose3d), W_pose3d, b_pose3d, y_pose3d),
+        ("world ", slice(n_pose3d, n_pose3d + n_world), W_world, b_world, y_world),
+        ("flag  ", slice(n_pose3d + n_world, n_total), W_flag, b_flag, y_flag),
+    ]
+
+    # Fill preallocated contiguous FP32 buffers instead of vstack/concatenate
+    A = np.empty((n_total, W_pose3d.shape[1]), dtype=np.float32)  # (195+117+1, 1152)
+    b_all = np.empty(n_total, dtype=np.float32)
+    rhs = np.empty(n_total, dtype=np.float32)
+    for _, sl, W, b, y in head_slices:
+        A[sl] = W
+        b_all[sl] = b
+        np.subtract(y, b, out=rhs[sl])
 
     print(f"    A shape  : {A.shape}")
     print(f"    rhs shape: {rhs.shape}")
 
-    print("\n[3] Solving for backbone feature vector x (least-squares)…")
-    x, residuals, rank, s = np.linalg.lstsq(A, rhs, rcond=None)
+    x = None
+    if os.path.exists(GOLDEN_BACKBONE_FEAT):
+        print(f"\n[3] Checking captured backbone feature {GOLDEN_BACKBONE_FEAT}…")
+        x_cap = np.load(GOLDEN_BACKBONE_FEAT).astype(np.float32).reshape(-1)
+        if x_cap.size != A.shape[1]:
+            print(f"    WARNING: captured feature has {x_cap.size} values, expected "
+                  f"{A.shape[1]}; ignoring it")
+        else:
+            rel = float(np.linalg.norm(A @ x_cap - rhs) / max(np.linalg.norm(rhs), 1e-12))
+            print(f"    relative residual: {rel:.3e} (tolerance {FEAT_REL_RESIDUAL_TOL:.0e})")
+            if rel <= FEAT_REL_RESIDUAL_TOL:
+                print("    -> using captured feature (no solve needed)")
+                x = x_cap
+            else:
+                print("    WARNING: captured feature does not reproduce the golden outputs "
+                      "(stale or unreadable capture?); ignoring it")
+
+    if x is None:
+        print("\n[3] Solving for backbone feature vector x (min-norm, Cholesky on A A^T)…")
+        x = solve_min_norm(A, rhs)
+    residual = float(np.linalg.norm(A @ x - rhs) ** 2)
 
     print(f"    x shape        : {x.shape} (expected 1152)")
-    print(f"    rank(A)        : {rank}")
-    if residuals.size > 0:
-        print(f"    sum residual^2 : {residuals[0]:.6e}")
-    else:
-        print("    residuals      : (none reported by lstsq)")
+    print(f"    sum residual^2 : {residual:.6e}")
 
     # Reshape to 2x2x288 feature map (for your own sanity checks)
     feat_fp32 = x.reshape(2, 2, 288)
     print(f"    reshaped feat  : {feat_fp32.shape} (2,2,288)")
 
     # Save FP32 feature
-    os.makedirs(WEIGHTS_DIR, exist_ok=True)
     np.save(os.path.join(WEIGHTS_DIR, "posehead_backbone_feat_fp32.npy"), feat_fp32)
     print("    -> saved FP32 feature as weights/posehead_backbone_feat_fp32.npy")
 
     # Quantize to Q15
     print("\n[4] Quantizing feature to Q15 and building PLIO stream…")
-    feat_q15 = np.round(feat_fp32 * Q_SCALE).astype(np.int32)
-    feat_q15 = np.clip(feat_q15, -32768, 32767)
+    feat_q15 = quantize_q15(feat_fp32)
 
-    # Save as .npy for debugging
+    # Save as .npy for debugging, plus a raw int16 .bin
+    # (np.fromfile(path, dtype="<i2").reshape(2, 2, 288))
     np.save(os.path.join(WEIGHTS_DIR, "posehead_backbone_feat_q15.npy"), feat_q15)
-    print("    -> saved Q15 feature as weights/posehead_backbone_feat_q15.npy")
+    write_stream_bin(os.path.join(WEIGHTS_DIR, "posehead_backbone_feat_q15.bin"), feat_q15)
+    print("    -> saved Q15 feature as weights/posehead_backbone_feat_q15.{npy,bin}")
 
     # Flatten in [h,w,c] row-major order (same as reshape)
     stream_1d = feat_q15.reshape(-1)  # length 1152
 
-    os.makedirs(STREAM_DIR, exist_ok=True)
-    stream_path = os.path.join(STREAM_DIR, "posehead_input_stream.txt")
-    with open(stream_path, "w") as f:
-        for v in stream_1d:
-            f.write(f"{int(v)}\n")
+    stream_base = os.path.join(STREAM_DIR, "posehead_input_stream")
+    if not args.no_text:
+        write_stream_txt(stream_base + ".txt", stream_1d)
+        print(f"    -> wrote PLIO input stream: {stream_base}.txt")
 
-    print(f"    -> wrote PLIO input stream: {stream_path} (len={len(stream_1d)})")
+    # .bin after .txt so it is never older than the text stream
+    write_stream_bin(stream_base + ".bin", stream_1d)
+    print(f"    -> wrote PLIO input stream: {stream_base}.bin (len={len(stream_1d)}, int16)")
 
     print("\n[5] Sanity-check: re-evaluate heads with recovered feature…")
 
-    # Recompute y = W x + b and compare to golden
+    # Recompute y = W x + b for all heads in one GEMV over the stacked A
     x_vec = feat_fp32.reshape(-1)  # 1152
+    y_hat_all = A @ x_vec + b_all
 
-    def head_check(name, W, b, y_gold):
-        y_hat = W @ x_vec + b
-        diff = y_hat - y_gold
+    for name, sl, _, _, y_gold in head_slices:
+        diff = y_hat_all[sl] - y_gold
         max_abs = np.max(np.abs(diff))
         rms = np.sqrt(np.mean(diff**2))
         print(f"    {name}: max_abs_err={max_abs:.6e}, rms_err={rms:.6e}")
 
-    head_check("pose3d", W_pose3d, b_pose3d, y_pose3d)
-    head_check("world ", W_world,  b_world,  y_world)
-    head_check("flag  ", W_flag,   b_flag,   y_flag)
+    # Same check through a bit-exact model of {pose3d,world,flag}_head_kernel.cpp
+    # on the streamed feature and Q15 weights/bias:
+    #   int32 acc = b_q;  acc += f_q * w_q (wraps mod 2^32);  acc >>= 15;  sat_q15
+    # compared in LSBs against the Q15 golden stream. Note the bias enters as
+    # raw Q15 before the shift, exactly as the kernels do it. Out-of-range
+    # (saturated) weights / feature / golden values and int32 wraps are
+    # counted so the cause of large errors is visible.
+    print("    AIE kernel model (int32 acc, errors in Q15 LSBs):")
+    q15_max = 32767 / Q_SCALE
+    A_q = quantize_q15(A).astype(np.int64)
+    acc64 = quantize_q15(b_all).astype(np.int64) + A_q @ stream_1d.astype(np.int64)
+    acc32 = acc64.astype(np.int32)  # two's-complement wrap like the kernel's int32
+    y_q_all = np.clip(acc32 >> 15, -32768, 32767).astype(np.int64)
+    n_feat_sat = int(np.count_nonzero((x_vec > q15_max) | (x_vec < -1.0)))
+    print(f"    feature values saturated in Q15: {n_feat_sat}")
+
+    for name, sl, W, _, y_gold in head_slices:
+        diff = y_q_all[sl] - quantize_q15(y_gold).astype(np.int64)
+        n_w_sat = int(np.count_nonzero((W > q15_max) | (W < -1.0)))
+        n_out_sat = int(np.count_nonzero((y_gold > q15_max) | (y_gold < -1.0)))
+        n_wrap = int(np.count_nonzero(acc64[sl] != acc32[sl]))
+        print(f"    {name}: mismatches={int(np.count_nonzero(diff))}/{diff.size}, "
+              f"max_abs_err={np.max(np.abs(diff))}, "
+              f"rms_err={np.sqrt(np.mean(diff**2.0)):.3f}")
+        print(f"            int32 wraps={n_wrap}, saturated weights={n_w_sat}, "
+              f"saturated golden outputs={n_out_sat}")
 
     print("\n[DONE] Pose-head input PLIO stream generated.")
     print("       Use weights/streams/posehead_input_stream.txt as your feat_in PLIO source.")
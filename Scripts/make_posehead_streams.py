@@ -1,23 +1,31 @@
 #!/usr/bin/env python3
 import os
 import json
-import numpy as np
+import argparse
+
+from posehead_common import load_array, write_stream_bin, write_stream_txt
 
 WEIGHTS_DIR = "weights"
 OUT_DIR = os.path.join(WEIGHTS_DIR, "streams")
 
 
-def write_stream_txt(path, arr_1d):
-    """
-    Write a 1D array of ints to a text file, one per line.
-    Values are written as Python ints (so effectively int32).
-    """
-    with open(path, "w") as f:
-        for v in arr_1d:
-            f.write(f"{int(v)}\n")
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebuild pose-head weight/bias streams from the exported Q15 .npy files "
+                    "(export_posehead_weights.py already writes them directly)."
+    )
+    parser.add_argument(
+        "--no-text",
+        action="store_true",
+        help="Only write the binary .bin streams (skip the .txt streams, which "
+             "prepare_aie_memory_blobs.py reads)",
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+
     print("[1] Loading manifest and Q15 weights…")
     manifest_path = os.path.join(WEIGHTS_DIR, "posehead_manifest.json")
     with open(manifest_path, "r") as f:
@@ -40,8 +48,9 @@ def main():
         w_q15_path = os.path.join(WEIGHTS_DIR, info["w_q15"])
         b_q15_path = os.path.join(WEIGHTS_DIR, info["b_q15"])
 
-        w_q15 = np.load(w_q15_path)   # shape: (out_ch, 2, 2, 288)
-        b_q15 = np.load(b_q15_path)   # shape: (out_ch,) or (1,) for flag
+        # Memory-mapped (.npy) or compressed (.npz): we only read, reshape and stream these out
+        w_q15 = load_array(w_q15_path, mmap_mode="r")  # (out_ch, 2, 2, 288)
+        b_q15 = load_array(b_q15_path, mmap_mode="r")  # (out_ch,) or (1,) for flag
 
         print(f"  w_q15 shape: {w_q15.shape}, dtype={w_q15.dtype}")
         print(f"  b_q15 shape: {b_q15.shape}, dtype={b_q15.dtype}")
@@ -59,20 +68,27 @@ def main():
         #   weights_stream = [w[0,0], w[0,1], ..., w[0,1151],
         #                     w[1,0], ..., w[1,1151],
         #                     ...]
-        w_stream = w_flat.astype(np.int32).reshape(-1)
+        # Kept as int16 (Q15) end to end, which is what the AIE streams carry.
+        w_stream = w_flat.reshape(-1)
 
         # Bias: just in out_ch order (or 1 for flag)
-        b_stream = b_q15.astype(np.int32).reshape(-1)
-
-        # Write to text files
-        w_stream_path = os.path.join(OUT_DIR, f"{head}_head_weights_stream.txt")
-        b_stream_path = os.path.join(OUT_DIR, f"{head}_head_bias_stream.txt")
-
-        write_stream_txt(w_stream_path, w_stream)
-        write_stream_txt(b_stream_path, b_stream)
-
-        print(f"  -> wrote weights stream: {w_stream_path} (len={len(w_stream)})")
-        print(f"  -> wrote bias    stream: {b_stream_path} (len={len(b_stream)})")
+        b_stream = b_q15.reshape(-1)
+
+        # Write text streams (unless --no-text), then binary streams (always),
+        # so each .bin is never older than its .txt
+        w_stream_base = os.path.join(OUT_DIR, f"{head}_head_weights_stream")
+        b_stream_base = os.path.join(OUT_DIR, f"{head}_head_bias_stream")
+
+        if not args.no_text:
+            write_stream_txt(w_stream_base + ".txt", w_stream)
+            write_stream_txt(b_stream_base + ".txt", b_stream)
+            print(f"  -> wrote weights stream: {w_stream_base}.txt")
+            print(f"  -> wrote bias    stream: {b_stream_base}.txt")
+
+        write_stream_bin(w_stream_base + ".bin", w_stream)
+        write_stream_bin(b_stream_base + ".bin", b_stream)
+        print(f"  -> wrote weights stream: {w_stream_base}.bin (len={len(w_stream)})")
+        print(f"  -> wrote bias    stream: {b_stream_base}.bin (len={len(b_stream)})")
 
     print("\n[DONE] Pose-head streams written to:", OUT_DIR)
 
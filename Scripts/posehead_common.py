@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the pose-head export / stream / validation scripts.
+
+process_head_tensor() is the single-pass path used by
+export_posehead_weights.py: each tensor is quantized once and all of its
+artifacts (.npy variants and PLIO streams) are written in the same visit.
+"""
+import os
+from collections import defaultdict
+import numpy as np
+
+Q_SCALE = 2**15  # Q15
+
+
+# ---------------------------------------------------------------------
+#  Q15 quantization
+# ---------------------------------------------------------------------
+def quantize_q15(arr: np.ndarray) -> np.ndarray:
+    """
+    Convert float (FP16/FP32) to Q15 int16: x_q15 = round(x * 2^15), clamped.
+    Scaling by 2^15 only shifts the exponent, so x * 2^15 is exact in FP32
+    unless it overflows, which only happens for |x| > ~1e34 -- far outside
+    the Q15 range, and the resulting +/-inf is clipped to the same int16
+    limit. So no FP64 upcast is needed, and rint() then rounds half-to-even
+    exactly like np.round did on FP64. The round/clip are done in place on
+    the one FP32 temporary.
+    """
+    # Overflow to +/-inf is expected there and absorbed by the clip below
+    with np.errstate(over="ignore"):
+        q = np.ascontiguousarray(arr, dtype=np.float32) * np.float32(Q_SCALE)
+    np.rint(q, out=q)
+    np.clip(q, -32768.0, 32767.0, out=q)
+    return q.astype(np.int16, copy=False)
+
+
+# ---------------------------------------------------------------------
+#  TFLite tensor lookup
+# ---------------------------------------------------------------------
+def index_by_shape(details):
+    """
+    Bucket tensor details by shape tuple once, so each lookup only has to
+    scan the (small) list of tensors with the requested shape.
+    """
+    shape_index = defaultdict(list)
+    for d in details:
+        shape_index[tuple(d["shape"])].append(d)
+    return shape_index
+
+
+def find_tensor(shape_index, name_substr, expected_shape):
+    """
+    Find a unique tensor whose name contains `name_substr` and whose shape
+    matches `expected_shape`. Prefer non-*_dequantize tensors.
+    `shape_index` is the mapping returned by index_by_shape().
+    """
+    candidates = shape_index.get(tuple(expected_shape), [])
+    hit_count = non_deq_count = 0
+    first_hit = first_non_deq = None
+    for d in candidates:
+        if name_substr not in d["name"]:
+            continue
+        hit_count += 1
+        if first_hit is None:
+            first_hit = d
+        if "dequantize" not in d["name"].lower():
+            non_deq_count += 1
+            if first_non_deq is None:
+                first_non_deq = d
+
+    if hit_count == 0:
+        msg = [
+            f"ERROR: No tensor found for substring='{name_substr}',",
+            f"       expected shape={tuple(expected_shape)}",
+        ]
+        raise RuntimeError("\n".join(msg))
+
+    # Prefer non-dequantize tensors
+    if non_deq_count == 1:
+        return first_non_deq
+    if hit_count == 1:
+        return first_hit
+
+    # Ambiguous: only now collect the matches for the error message
+    matches = [d for d in candidates if name_substr in d["name"]]
+    if non_deq_count > 1:
+        matches = [d for d in matches if "dequantize" not in d["name"].lower()]
+    msg = ["ERROR: Ambiguous tensor match:"]
+    for d in matches:
+        msg.append(
+            f"  idx={d['index']}, name={d['name']}, shape={tuple(d['shape'])}, dtype={d['dtype']}"
+        )
+    raise RuntimeError("\n".join(msg))
+
+
+# ---------------------------------------------------------------------
+#  Writers
+# ---------------------------------------------------------------------
+def save_npy(path, arr):
+    """np.save into an already-open binary handle (no pickle sniffing)."""
+    with open(path, "wb") as f:
+        np.save(f, arr, allow_pickle=False)
+
+
+def save_array(path, arr, compress=False):
+    """
+    Save `arr` to `path` (a .npy name). With compress=True it is written as
+    np.savez_compressed(<stem>.npz, data=arr) instead, which is worth it for
+    one-shot/cold-storage exports but too slow for inner-loop I/O.
+    Returns the path actually written.
+    """
+    if compress:
+        path = os.path.splitext(path)[0] + ".npz"
+        np.savez_compressed(path, data=arr)
+    else:
+        save_npy(path, arr)
+    return path
+
+
+def load_array(path, mmap_mode=None):
+    """
+    Load an array written by save_array(): .npz archives hold it under
+    "data"; plain .npy files can be memory-mapped with mmap_mode.
+    """
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=False) as npz:
+            return npz["data"]
+    return np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+
+
+def write_stream_txt(path, arr_1d):
+    """
+    Write a 1D array of ints to a text file, one per line.
+    Formatting is done in one np.savetxt call rather than a per-value loop;
+    "%d" works for int16 directly, so no widening copy is made.
+    """
+    np.savetxt(path, np.asarray(arr_1d).reshape(-1), fmt="%d")
+
+
+def write_stream_bin(path, arr_1d):
+    """
+    Write a 1D array of Q15 values as a raw little-endian int16 stream (same
+    values as the text stream, no per-value formatting).
+    """
+    np.asarray(arr_1d, dtype="<i2").reshape(-1).tofile(path)
+
+
+# ---------------------------------------------------------------------
+#  Single-pass export
+# ---------------------------------------------------------------------
+def process_head_tensor(base_name, arr, out_dir, stream_base=None, stream_t_base=None,
+                        want_fp32=True, want_q15=True, text=True, compress=False):
+    """
+    Quantize one pose-head tensor once and write every requested artifact:
+      <out_dir>/<base_name>_fp32.npy            (want_fp32; .npz if compress)
+      <out_dir>/<base_name>_q15.npy             (want_q15;  .npz if compress)
+      <stream_base>.bin / .txt                  (stream_base given; .txt if text)
+      <stream_t_base>.bin / .txt                (stream_t_base given; .txt if text)
+    stream_base is the Q15 values flattened row-major, i.e. for conv weights
+    (out_ch, 2, 2, 288) one 1152-long row per output channel ("out_x_in"),
+    which is what the AIE head kernels read. stream_t_base is the transposed
+    (1152, out_ch) "in_x_out" order, for kernels that accumulate several
+    output channels per input sample.
+    Returns (fp32_array, q15_array, log_lines); q15_array is None if neither
+    the .npy nor a stream needed it.
+    """
+    # Convert FP16 -> FP32 if needed (no copy if already FP32)
+    arr_fp32 = arr.astype(np.float32, copy=False)
+    need_q15 = want_q15 or stream_base is not None or stream_t_base is not None
+    q15 = quantize_q15(arr_fp32) if need_q15 else None
+
+    lines = [f"    Saved {base_name}:"]
+
+    if want_fp32:
+        fp32_path = save_array(os.path.join(out_dir, f"{base_name}_fp32.npy"),
+                               arr_fp32, compress)
+        lines.append(f"      FP32 -> {fp32_path}  shape={arr_fp32.shape}, dtype={arr_fp32.dtype}")
+
+    if want_q15:
+        q15_path = save_array(os.path.join(out_dir, f"{base_name}_q15.npy"),
+                              q15, compress)
+        lines.append(f"      Q15  -> {q15_path}   shape={q15.shape}, dtype={q15.dtype}")
+
+    # Text first, then .bin: a .bin never older than its .txt is a valid
+    # parse cache for it (see prepare_aie_memory_blobs.read_int16_stream)
+    if stream_base is not None:
+        if text:
+            write_stream_txt(stream_base + ".txt", q15)
+            lines.append(f"      TXT  -> {stream_base}.txt")
+        write_stream_bin(stream_base + ".bin", q15)
+        lines.append(f"      BIN  -> {stream_base}.bin  (len={q15.size}, int16)")
+
+    if stream_t_base is not None:
+        q15_t = np.ascontiguousarray(q15.reshape(q15.shape[0], -1).T)  # (in_ch, out_ch)
+        if text:
+            write_stream_txt(stream_t_base + ".txt", q15_t)
+            lines.append(f"      TXT  -> {stream_t_base}.txt")
+        write_stream_bin(stream_t_base + ".bin", q15_t)
+        lines.append(f"      BIN  -> {stream_t_base}.bin  (shape={q15_t.shape}, in_x_out)")
+
+    return arr_fp32, q15, lines
@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 import os
+import json
+import shutil
 import numpy as np
 
+try:
+    import pandas as pd
+except ImportError:
+    # pandas is optional; read_int16_stream falls back to np.loadtxt
+    pd = None
+
 # ------------------------------------------------------------------------------------
 # Paths
 # ------------------------------------------------------------------------------------
@@ -16,27 +24,62 @@ POSE3D_IN_CH = 1152  # 2×2×288
 WORLD_IN_CH  = 1152  # 2×2×288
 FLAG_IN_CH   = 1152  # 2×2×288 
 
+# AIE_SHARE_FEATURES=1: consumers read the shared posehead_input_q15.bin
+# (described by posehead_input_q15.json), so the per-head *_feat.txt PLIO
+# copies are not written
+SHARE_FEATURES = os.environ.get("AIE_SHARE_FEATURES", "0") == "1"
+
 
 # ------------------------------------------------------------------------------------
 # Helpers
 # ------------------------------------------------------------------------------------
 def read_int16_stream(path: str) -> np.ndarray:
-    """Read a plain-text stream of ints as int16 numpy array."""
-    if not os.path.exists(path):
+    """
+    Read a plain-text stream of ints as int16 numpy array.
+    If a sibling <stem>.bin (raw little-endian int16) exists and is not older
+    than the .txt (or there is no .txt), it is read with np.fromfile instead
+    of parsing text.
+    Otherwise the text is parsed with pandas' C parser when available (much
+    faster than np.loadtxt on the 1152*OUT_CH weight streams), else
+    np.loadtxt, and the .bin sidecar is written so the next run can skip the
+    parse.
+    """
+    bin_path = os.path.splitext(path)[0] + ".bin" if path.endswith(".txt") else None
+    has_txt = os.path.exists(path)
+    if (bin_path is not None and os.path.exists(bin_path)
+            and (not has_txt or os.path.getmtime(bin_path) >= os.path.getmtime(path))):
+        # Covers --no-text runs of the stream scripts, which only write the .bin
+        arr = np.fromfile(bin_path, dtype="<i2")
+    elif not has_txt:
         raise FileNotFoundError(path)
-    arr = np.loadtxt(path, dtype=np.int16)
-    if arr.ndim == 0:
-        arr = arr.reshape(1)
+    else:
+        if pd is not None:
+            arr = pd.read_csv(path, header=None, sep=r"\s+", dtype=np.int16,
+                              engine="c").to_numpy().ravel()
+        else:
+            arr = np.loadtxt(path, dtype=np.int16)
+        if arr.ndim == 0:
+            arr = arr.reshape(1)
+        if bin_path is not None:
+            try:
+                np.ascontiguousarray(arr, dtype="<i2").tofile(bin_path)
+            except OSError as e:
+                print(f"  [WARN] could not write stream cache {bin_path}: {e}")
     return arr
 
 
-def write_npy_and_bin(base_path: str, arr: np.ndarray):
-    """Save both .npy and raw .bin (little-endian int16)."""
-    npy_path = base_path + ".npy"
+def write_npy_and_bin(base_path: str, arr: np.ndarray, npy: bool = True):
+    """
+    Save both .npy and raw .bin (little-endian int16), or only the .bin when
+    npy=False. The .bin is written straight from arr's buffer when it is
+    already contiguous int16 (no astype copy).
+    """
     bin_path = base_path + ".bin"
-    np.save(npy_path, arr)
-    arr.astype(np.int16).tofile(bin_path)
-    print(f"  -> {npy_path} (shape {arr.shape}, dtype={arr.dtype})")
+    if npy:
+        npy_path = base_path + ".npy"
+        np.save(npy_path, arr)
+        print(f"  -> {npy_path} (shape {arr.shape}, dtype={arr.dtype})")
+    np.ascontiguousarray(arr, dtype="<i2").tofile(bin_path)
     print(f"  -> {bin_path} (raw {arr.size} int16 elements)")
 
 
@@ -51,14 +94,34 @@ def write_plio_txt_int16(arr: np.ndarray, txt_path: str):
     if pad:
         flat = np.concatenate([flat, np.zeros(pad, dtype=np.int16)])
         print(f"  [PLIO] padded {pad} zeros → total {flat.size} samples for {os.path.basename(txt_path)}")
+    assert flat.size % 8 == 0
 
-    with open(txt_path, "w") as f:
-        for i in range(0, flat.size, 8):
-            chunk = flat[i:i+8]
-            f.write(" ".join(str(int(v)) for v in chunk) + "\n")
+    # One NumPy formatting call instead of a Python loop per 8-sample line
+    np.savetxt(txt_path, flat.reshape(-1, 8), fmt="%d", delimiter=" ")
     print(f"  -> {txt_path} (PLIO text, 8 samples/line)")
 
 
+def link_or_copy(src: str, dst: str):
+    """
+    Make dst a hardlink to src (replacing any existing dst), or a plain copy
+    on filesystems that cannot hardlink.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # Already linked (rename() would be a no-op and leave tmp behind)
+        print(f"  -> {dst} (hardlink to {os.path.basename(src)})")
+        return
+    tmp = dst + ".tmp"
+    try:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.link(src, tmp)
+        os.replace(tmp, dst)
+        print(f"  -> {dst} (hardlink to {os.path.basename(src)})")
+    except OSError:
+        shutil.copyfile(src, dst)
+        print(f"  -> {dst} (copy of {os.path.basename(src)})")
+
+
 # ------------------------------------------------------------------------------------
 # Builders
 # ------------------------------------------------------------------------------------
@@ -67,7 +130,9 @@ def build_input_blob():
     Shared pose-head input:
       - Reads posehead_input_stream.txt (int16)
       - Writes posehead_input_q15.npy/.bin
+      - Writes posehead_input_q15.json describing the .bin layout
       - Writes PLIO feature streams: pose3d_feat.txt, world_feat.txt, flag_feat.txt
+        (skipped when AIE_SHARE_FEATURES=1)
     """
     print("[1] Preparing shared pose-head input blob from posehead_input_stream.txt")
 
@@ -79,10 +144,36 @@ def build_input_blob():
     base = os.path.join(STREAM_DIR, "posehead_input_q15")
     write_npy_and_bin(base, x)
 
-    # PLIO feature streams (all three heads share the same backbone features)
-    for name in ["pose3d_feat.txt", "world_feat.txt", "flag_feat.txt"]:
-        txt_path = os.path.join(STREAM_DIR, name)
-        write_plio_txt_int16(x, txt_path)
+    # Layout of the raw .bin, so consumers can np.memmap / map it directly
+    desc = {
+        "file": os.path.basename(base) + ".bin",
+        "dtype": "int16",
+        "byteorder": "little",
+        "shape": [int(x.size)],
+        "offset": 0,
+        "consumers": ["pose3d", "world", "flag"],
+    }
+    with open(base + ".json", "w") as f:
+        json.dump(desc, f, indent=2)
+    print(f"  -> {base}.json (layout descriptor)")
+
+    feat_names = ["pose3d_feat.txt", "world_feat.txt", "flag_feat.txt"]
+    if SHARE_FEATURES:
+        print("  AIE_SHARE_FEATURES=1: skipping per-head *_feat.txt PLIO streams")
+        # Remove copies from an earlier run so no PLIO flow reads stale features
+        for name in feat_names:
+            stale = os.path.join(STREAM_DIR, name)
+            if os.path.lexists(stale):
+                os.remove(stale)
+                print(f"  removed stale {stale} (use posehead_input_q15.bin instead)")
+        return
+
+    # PLIO feature streams (all three heads share the same backbone features):
+    # format once, then link the other two names to the same file
+    feat_path = os.path.join(STREAM_DIR, feat_names[0])
+    write_plio_txt_int16(x, feat_path)
+    for name in feat_names[1:]:
+        link_or_copy(feat_path, os.path.join(STREAM_DIR, name))
 
 
 def build_head_blobs(
@@ -133,8 +224,14 @@ def build_head_blobs(
             f"{head_name}: bias length {b.size} does not match OUT_CH={out_ch}"
         )
 
-    # Reshape weights to (OUT_CH, IN_CH)
-    w_mat = w_flat.reshape(out_ch, in_ch)
+    # Build FC-packed blob: [bias, w0..w_IN-1] per output row.
+    # The weights are copied straight into their columns of the FC buffer
+    # and w_mat is a view of them, so no separate weight matrix is kept.
+    # (np.empty: both column ranges are overwritten, so no zero-fill pass)
+    fc = np.empty((out_ch, 1 + in_ch), dtype=np.int16)
+    fc[:, 0] = b
+    np.copyto(fc[:, 1:], w_flat.reshape(out_ch, in_ch))
+    w_mat = fc[:, 1:]
     print(f"  weights matrix shape: {w_mat.shape}")
     print(f"  bias vector shape   : {b.shape}")
 
@@ -144,15 +241,9 @@ def build_head_blobs(
     write_npy_and_bin(w_base, w_mat)
     write_npy_and_bin(b_base, b)
 
-    # Build FC-packed blob: [bias, w0..w_IN-1] per output row
-    fc = np.zeros((out_ch, 1 + in_ch), dtype=np.int16)
-    fc[:, 0]  = b
-    fc[:, 1:] = w_mat
-
     print(f"  FC packed shape: {fc.shape} → {fc.size} int16 values")
     fc_base = os.path.join(STREAM_DIR, f"{head_name}_fc_q15")
-    fc.tofile(fc_base + ".bin")
-    print(f"  -> {fc_base}.bin")
+    write_npy_and_bin(fc_base, fc, npy=False)
 
     # PLIO text stream for weights+bias (what AIE PLIO will read)
     # Flatten row-major: bias0, w0_0..w0_(IN-1), bias1, w1_0.. etc.
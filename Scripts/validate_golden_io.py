@@ -23,14 +23,24 @@ ATOL = 1e-7
 # -------------------------------------------------------------------------
 # Helpers
 # -------------------------------------------------------------------------
-def run_model(input_array):
-    """Run the TFLite model on input_array and return the 5 outputs."""
+_INTR = None         # interpreter, built once per process
+_INPUT_IDX = None
+_OUTPUT_IDXS = None
+
+
+def get_interpreter():
+    """Build, allocate and cache the TFLite interpreter on first use."""
+    global _INTR, _INPUT_IDX, _OUTPUT_IDXS
+    if _INTR is not None:
+        return _INTR
+
     # Try to keep delegates off (if runtime honors it)
     os.environ["TFLITE_DISABLE_XNNPACK"] = "1"
 
     intr = tflite.Interpreter(
         model_path=MODEL_PATH,
-        experimental_delegates=[]
+        experimental_delegates=[],
+        num_threads=os.cpu_count(),
     )
     intr.allocate_tensors()
 
@@ -40,23 +50,78 @@ def run_model(input_array):
     print("[run_model] input_details:", input_details)
     print("[run_model] output_details:", output_details)
 
-    # Assume single input tensor
-    in_idx = input_details[0]["index"]
-    intr.set_tensor(in_idx, input_array)
+    # Assume single input tensor; outputs in the same order as make_golden_io.py
+    _INPUT_IDX = input_details[0]["index"]
+    _OUTPUT_IDXS = tuple(d["index"] for d in output_details[:5])
+    _INTR = intr
+    return intr
+
+
+def run_model(input_array):
+    """
+    Run the TFLite model on input_array and return the 5 outputs.
+    The outputs are zero-copy views into the interpreter's tensor arena
+    (intr.tensor(i)()), valid until the next run_model() call; copy them
+    if they must outlive it. TFLite refuses to invoke() while such views
+    are still referenced.
+    """
+    intr = get_interpreter()
+
+    intr.set_tensor(_INPUT_IDX, input_array)
     intr.invoke()
 
-    # Same order as we used in make_golden_io.py
-    out_pose3d = intr.get_tensor(output_details[0]["index"])  # (1,195)
-    out_flag   = intr.get_tensor(output_details[1]["index"])  # (1,1)
-    out_seg    = intr.get_tensor(output_details[2]["index"])  # (1,256,256,1)
-    out_hm     = intr.get_tensor(output_details[3]["index"])  # (1,64,64,39)
-    out_world  = intr.get_tensor(output_details[4]["index"])  # (1,117)
+    out_pose3d = intr.tensor(_OUTPUT_IDXS[0])()  # (1,195)
+    out_flag   = intr.tensor(_OUTPUT_IDXS[1])()  # (1,1)
+    out_seg    = intr.tensor(_OUTPUT_IDXS[2])()  # (1,256,256,1)
+    out_hm     = intr.tensor(_OUTPUT_IDXS[3])()  # (1,64,64,39)
+    out_world  = intr.tensor(_OUTPUT_IDXS[4])()  # (1,117)
 
     return out_pose3d, out_flag, out_seg, out_hm, out_world
 
 
-def compare_arrays(name, golden, current):
-    """Compare two arrays and print detailed error stats."""
+def rel_denom(golden):
+    """
+    Relative-error denominator max(|golden|, 1e-8), computed once per golden
+    tensor so repeated comparisons can reuse it.
+    """
+    if golden is None:
+        return None
+    denom = np.abs(golden)
+    np.maximum(denom, 1e-8, out=denom)
+    return denom
+
+
+def error_stats(golden, current, denom=None):
+    """
+    Return (max_abs, mean_abs, rms, max_rel, allclose) for current vs golden.
+    `denom` is an optional precomputed rel_denom(golden). The diff and
+    |diff| temporaries are reused in place for the squared and relative
+    errors.
+    """
+    diff = current - golden
+    abs_diff = np.abs(diff)
+
+    max_abs = float(abs_diff.max())
+    mean_abs = float(abs_diff.mean())
+    # diff isn't needed after this, so square it in place
+    np.multiply(diff, diff, out=diff)
+    rms = float(np.sqrt(diff.mean()))
+    if denom is None:
+        denom = rel_denom(golden)
+    # abs_diff isn't needed after this, so divide into it instead of
+    # allocating the ratio array
+    np.divide(abs_diff, denom, out=abs_diff)
+    max_rel = float(abs_diff.max())
+
+    allclose = bool(np.allclose(current, golden, rtol=RTOL, atol=ATOL))
+    return max_abs, mean_abs, rms, max_rel, allclose
+
+
+def compare_arrays(name, golden, current, denom=None):
+    """
+    Compare two arrays and print detailed error stats.
+    `denom` is an optional precomputed rel_denom(golden).
+    """
     print(f"\n=== {name} ===")
 
     if golden.shape != current.shape:
@@ -65,16 +130,7 @@ def compare_arrays(name, golden, current):
         print(f"    current: {current.shape}")
         return False
 
-    diff = current - golden
-    abs_diff = np.abs(diff)
-
-    max_abs = float(abs_diff.max())
-    mean_abs = float(abs_diff.mean())
-    rms = float(np.sqrt(np.mean(diff ** 2)))
-    denom = np.maximum(np.abs(golden), 1e-8)
-    max_rel = float((abs_diff / denom).max())
-
-    allclose = np.allclose(current, golden, rtol=RTOL, atol=ATOL)
+    max_abs, mean_abs, rms, max_rel, allclose = error_stats(golden, current, denom)
 
     print(f"  shape        : {golden.shape}")
     print(f"  max_abs_err  : {max_abs:.6e}")
@@ -95,20 +151,23 @@ def main():
     if not os.path.exists(GOLDEN_INPUT):
         raise FileNotFoundError(f"Missing golden input: {GOLDEN_INPUT}")
 
-    golden_input = np.load(GOLDEN_INPUT)
+    # Memory-mapped: each golden tensor is only read once by compare_arrays
+    golden_input = np.load(GOLDEN_INPUT, mmap_mode="r")
     print(f"    golden_input shape: {golden_input.shape}, dtype: {golden_input.dtype}")
 
-    golden_pose3d = np.load(GOLDEN_POSE3D)
-    golden_flag   = np.load(GOLDEN_FLAG)
-    golden_seg    = np.load(GOLDEN_SEG)
-    golden_hm     = np.load(GOLDEN_HM)
-    golden_world  = np.load(GOLDEN_WORLD)
+    golden_pose3d = np.load(GOLDEN_POSE3D, mmap_mode="r")
+    golden_flag   = np.load(GOLDEN_FLAG,   mmap_mode="r")
+    golden_world  = np.load(GOLDEN_WORLD,  mmap_mode="r")
+
+    # seg/heatmap are only written by `make_golden_io.py --save-all`
+    golden_seg = np.load(GOLDEN_SEG, mmap_mode="r") if os.path.exists(GOLDEN_SEG) else None
+    golden_hm  = np.load(GOLDEN_HM,  mmap_mode="r") if os.path.exists(GOLDEN_HM)  else None
 
     print("    Loaded golden outputs:")
     print(f"      pose3d : {golden_pose3d.shape}")
     print(f"      flag   : {golden_flag.shape}")
-    print(f"      seg    : {golden_seg.shape}")
-    print(f"      heatmap: {golden_hm.shape}")
+    print(f"      seg    : {golden_seg.shape if golden_seg is not None else 'missing (skipped)'}")
+    print(f"      heatmap: {golden_hm.shape if golden_hm is not None else 'missing (skipped)'}")
     print(f"      world  : {golden_world.shape}")
 
     print("\n[2] Re-running TFLite model on golden input…")
@@ -116,20 +175,31 @@ def main():
 
     print("\n[3] Comparing re-run outputs against golden_*_fp32.npy …")
 
-    ok_pose3d = compare_arrays("POSE3D", golden_pose3d, cur_pose3d)
-    ok_flag   = compare_arrays("FLAG",   golden_flag,   cur_flag)
-    ok_seg    = compare_arrays("SEG",    golden_seg,    cur_seg)
-    ok_hm     = compare_arrays("HEATMAP",golden_hm,     cur_hm)
-    ok_world  = compare_arrays("WORLD",  golden_world,  cur_world)
+    # Relative-error denominators, once per golden tensor
+    denom_pose3d = rel_denom(golden_pose3d)
+    denom_flag   = rel_denom(golden_flag)
+    denom_seg    = rel_denom(golden_seg)
+    denom_hm     = rel_denom(golden_hm)
+    denom_world  = rel_denom(golden_world)
+
+    ok_pose3d = compare_arrays("POSE3D", golden_pose3d, cur_pose3d, denom_pose3d)
+    ok_flag   = compare_arrays("FLAG",   golden_flag,   cur_flag,   denom_flag)
+    ok_seg    = compare_arrays("SEG",    golden_seg,    cur_seg,    denom_seg) if golden_seg is not None else None
+    ok_hm     = compare_arrays("HEATMAP",golden_hm,     cur_hm,     denom_hm)  if golden_hm  is not None else None
+    ok_world  = compare_arrays("WORLD",  golden_world,  cur_world,  denom_world)
+
+    # Skipped (None) comparisons don't fail the run
+    all_ok = all(ok is None or ok for ok in (ok_pose3d, ok_flag, ok_seg, ok_hm, ok_world))
 
-    all_ok = ok_pose3d and ok_flag and ok_seg and ok_hm and ok_world
+    def status(ok):
+        return "SKIPPED" if ok is None else ("OK" if ok else "MISMATCH")
 
     print("\n[4] SUMMARY")
-    print(f"  POSE3D : {'OK' if ok_pose3d else 'MISMATCH'}")
-    print(f"  FLAG   : {'OK' if ok_flag   else 'MISMATCH'}")
-    print(f"  SEG    : {'OK' if ok_seg    else 'MISMATCH'}")
-    print(f"  HEATMAP: {'OK' if ok_hm     else 'MISMATCH'}")
-    print(f"  WORLD  : {'OK' if ok_world  else 'MISMATCH'}")
+    print(f"  POSE3D : {status(ok_pose3d)}")
+    print(f"  FLAG   : {status(ok_flag)}")
+    print(f"  SEG    : {status(ok_seg)}")
+    print(f"  HEATMAP: {status(ok_hm)}")
+    print(f"  WORLD  : {status(ok_world)}")
     print(f"\n  OVERALL: {'PASS' if all_ok else 'FAIL'}")
 
 
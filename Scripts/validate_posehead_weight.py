@@ -3,6 +3,8 @@ import os
 import json
 import numpy as np
 
+from posehead_common import find_tensor, index_by_shape, load_array
+
 os.environ.setdefault("TFLITE_DISABLE_XNNPACK", "1")
 
 try:
@@ -15,39 +17,12 @@ MODEL_PATH = "pose_landmark_full.tflite"
 WEIGHTS_DIR = "weights"
 
 
-def find_tensor(details, name_substr, expected_shape):
-    matches = []
-    for d in details:
-        if name_substr in d["name"] and tuple(d["shape"]) == tuple(expected_shape):
-            matches.append(d)
-
-    if not matches:
-        msg = [
-            f"ERROR: No tensor found for substring='{name_substr}',",
-            f"       expected shape={tuple(expected_shape)}",
-        ]
-        raise RuntimeError("\n".join(msg))
-
-    non_deq = [d for d in matches if "dequantize" not in d["name"].lower()]
-    if len(non_deq) == 1:
-        return non_deq[0]
-    if len(non_deq) > 1:
-        matches = non_deq
-
-    if len(matches) != 1:
-        msg = ["ERROR: Ambiguous tensor match:"]
-        for d in matches:
-            msg.append(
-                f"  idx={d['index']}, name={d['name']}, shape={tuple(d['shape'])}, dtype={d['dtype']}"
-            )
-        raise RuntimeError("\n".join(msg))
-
-    return matches[0]
-
-
 def compare(name, arr_model, arr_file):
-    arr_model = arr_model.astype(np.float32)
-    arr_file = arr_file.astype(np.float32)
+    # Both sides are normally FP32 already; only upcast when they aren't
+    if arr_model.dtype != np.float32:
+        arr_model = arr_model.astype(np.float32, copy=False)
+    if arr_file.dtype != np.float32:
+        arr_file = arr_file.astype(np.float32, copy=False)
 
     if arr_model.shape != arr_file.shape:
         print(f"  {name}: SHAPE MISMATCH model={arr_model.shape}, file={arr_file.shape}")
@@ -78,39 +53,40 @@ def main():
     details = interpreter.get_tensor_details()
 
     print("    allocate_tensors done, #tensors =", len(details))
+    by_shape = index_by_shape(details)
 
     # Pose3D
     pose3d_w_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/convld_3d/Conv2D",
         expected_shape=(195, 2, 2, 288),
     )
     pose3d_b_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/convld_3d/BiasAdd",
         expected_shape=(195,),
     )
 
     # World
     world_w_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/convworld_3d/Conv2D",
         expected_shape=(117, 2, 2, 288),
     )
     world_b_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/convworld_3d/BiasAdd",
         expected_shape=(117,),
     )
 
     # Flag
     flag_w_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/conv_poseflag/Conv2D",
         expected_shape=(1, 2, 2, 288),
     )
     flag_b_info = find_tensor(
-        details,
+        by_shape,
         name_substr="model_1/model/conv_poseflag/BiasAdd",
         expected_shape=(1,),
     )
@@ -132,8 +108,8 @@ def main():
         w_file = os.path.join(WEIGHTS_DIR, head_manifest["w_fp32"])
         b_file = os.path.join(WEIGHTS_DIR, head_manifest["b_fp32"])
 
-        w_saved = np.load(w_file)
-        b_saved = np.load(b_file)
+        w_saved = load_array(w_file)
+        b_saved = load_array(b_file)
 
         w_model = interpreter.get_tensor(tensor_infos[head][0]["index"])
         b_model = interpreter.get_tensor(tensor_infos[head][1]["index"])